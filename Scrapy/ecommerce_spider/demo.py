@@ -1,19 +1,58 @@
 # demo.py
+import json
 import os
+import time
+from collections import deque
+from datetime import datetime
 
 from scrapy.crawler import CrawlerProcess
+from ecommerce_spider.download_profiles import apply_download_profile
+from ecommerce_spider.pipelines import export_started
 from ecommerce_spider.spiders.shopify_crawl import ShopifyCrawlFastSpider
 
 
-def run_batch(sites: list[dict]):
+HISTORY_FILE = "batch_history.json"
+
+
+def load_history(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_history(path: str, history: dict):
+    # 先写临时文件再原子替换：写到一半中断也不会把历史文件弄坏
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(history, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def schedule_sites(sites: list[dict], history: dict) -> list[dict]:
+    """
+    最长优先：按历史耗时从长到短排，没有历史的站点排最前（大小未知，先跑最稳妥），
+    这样大站不会在最后单独跑几个小时
+    """
+    def expected(site):
+        entry = history.get(site["domain"])
+        return entry["duration"] if entry else float("inf")
+
+    return sorted(sites, key=expected, reverse=True)
+
+
+def run_batch(sites: list[dict], profile: str = None, max_parallel: int = 8, history_file: str = HISTORY_FILE):
     """
     sites = [
         {"domain": "...", "category": "..."},
-        {"domain": "...", "category": "..."},
+        {"domain": "...", "category": "...", "max_items": 50000, "max_seconds": 3600},  # 可选单站预算
     ]
+    profile: 下载配置档，见 download_profiles.DOWNLOAD_PROFILES（如 "h2"）
+    max_parallel: 同时跑的站点数；一个站下载结束（开始导出）就补上下一个，导出在后台继续
+    history_file: 每站历史（条数/耗时/字节数），用于下次排程
     """
 
-    process = CrawlerProcess(settings={
+    settings = {
         # ==== 性能（极速版推荐）====
         "CONCURRENT_REQUESTS": 256,
         "CONCURRENT_REQUESTS_PER_DOMAIN": 32,
@@ -32,9 +71,51 @@ def run_batch(sites: list[dict]):
             "SKU", "Name", "Description", "Regular price", "Categories",
             "Images", "cf_opingts","自定义分类", "原站域名", "分布网站识别", "语言"
         ],
-    })
+        # 多站共用一个 reactor：导出放子进程，避免一个站写 Excel 时卡住其他站
+        "PANDAS_EXPORT_EXECUTOR": "process",
+        "PANDAS_EXPORT_PROCESSES": 2,  # 同时写 Excel 的子进程数，每个约占一个站的 rows + DataFrame 内存
+
+        # ==== 实时指标：http://127.0.0.1:9410/metrics（Prometheus 文本格式）====
+        "EXTENSIONS": {"ecommerce_spider.extensions.MetricsExtension": 500},
+        "METRICS_ENABLED": True,
+        "METRICS_PORT": 9410,
+        "METRICS_TEXTFILE": None,  # 也可写 textfile，例如 "/var/lib/node_exporter/crawler.prom"
+        "METRICS_INTERVAL": 5,
+    }
+    process = CrawlerProcess(settings=apply_download_profile(settings, profile))
 
-    for site in sites:
+    history = load_history(history_file)
+    queue = deque(schedule_sites(sites, history))
+
+    def released(slot):
+        """站点下载结束，让出并发名额；每个站只让一次"""
+        if slot["duration"] is None:
+            slot["duration"] = round(time.monotonic() - slot["started"], 1)
+            start_next()
+
+    def finished(result, site, crawler, slot):
+        released(slot)  # 没走到导出（例如启动失败）时在这里让出名额
+        stats = crawler.stats
+        reason = stats.get_value("finish_reason", "")
+        entry = {
+            "items": stats.get_value("item_scraped_count", 0),
+            "duration": slot["duration"],  # 下载耗时，即占用并发名额的时间，不含后台导出
+            "bytes": stats.get_value("downloader/response_bytes", 0),
+            "finish_reason": reason,
+            "updated": datetime.now().isoformat(timespec="seconds"),
+        }
+        old = history.get(site["domain"])
+        if reason.endswith("_budget") and old:
+            # 被预算截断的这次不代表完整耗时，保留更长的估计
+            entry["duration"] = max(entry["duration"], old["duration"])
+        history[site["domain"]] = entry
+        save_history(history_file, history)
+        return result
+
+    def start_next():
+        if not queue:
+            return
+        site = queue.popleft()
         domain = site["domain"]
         category = site.get("category", "未知分类")
 
@@ -46,12 +127,22 @@ def run_batch(sites: list[dict]):
         # ✅ 创建目录（已存在不会报错）
         os.makedirs(category_dir, exist_ok=True)
         export_file = os.path.join(category_dir, f"{site_name}.xlsx")
-        process.crawl(
-            ShopifyCrawlFastSpider,
+        crawler = process.create_crawler(ShopifyCrawlFastSpider)
+        slot = {"started": time.monotonic(), "duration": None}
+        # spider_closed 要等导出写完才发，所以用导出开始的信号来补位
+        crawler.signals.connect(lambda spider: released(slot), signal=export_started, weak=False)
+        d = process.crawl(
+            crawler,
             domain=domain,
             category=category,
             export_file=export_file,  # 👈 关键
+            max_items=site.get("max_items"),
+            max_seconds=site.get("max_seconds"),
         )
+        d.addBoth(finished, site, crawler, slot)
+
+    for _ in range(max_parallel or len(sites)):
+        start_next()
 
     process.start()
 
@@ -0,0 +1,136 @@
+# distributed.py
+# 超大 Woo 站点的单站分布式抓取：
+#   1. coordinator：解析站点地图，把商品 URL 写进共享 SQLite 队列
+#   2. worker：N 个进程（可在共享文件系统的多台机器上）从队列领 URL，每批处理完追加写入自己的 JSON lines 分片
+#   3. merge：合并所有分片、按 SKU 去重，生成最终 Excel
+#   requeue-failed：重试次数用完仍失败的 URL 放回队列（例如解封后），再跑 worker 补抓
+#
+# 例：
+#   python distributed.py coordinator https://koreanskincare.nl/sitemap.xml --queue work/koreanskincare.db --config configs/selectors/test.json
+#   python distributed.py worker https://koreanskincare.nl/sitemap.xml --queue work/koreanskincare.db --config configs/selectors/test.json --processes 4
+#   python distributed.py merge https://koreanskincare.nl/sitemap.xml --queue work/koreanskincare.db
+#   python distributed.py requeue-failed https://koreanskincare.nl/sitemap.xml --queue work/koreanskincare.db
+import argparse
+import glob
+import json
+import os
+from multiprocessing import Process
+from urllib.parse import urlparse
+
+from scrapy.crawler import CrawlerProcess
+
+from ecommerce_spider.pipelines import write_excel
+from ecommerce_spider.spiders.woo_crawl import WooCrawlSpider
+from ecommerce_spider.work_queue import WorkQueue
+from run import build_settings
+
+
+def site_name_of(domain: str) -> str:
+    # 与 WooCrawlSpider 里分片文件的命名保持一致
+    return urlparse(domain.rstrip("/")).netloc.replace(".", "_")
+
+
+def crawl(domain: str, category: str, config_file: str, mode: str, queue_file: str, profile: str = None):
+    settings = build_settings(f"{site_name_of(domain)}.xlsx", profile)
+    # 分布式模式下 worker 自己按批落盘分片，不走 PandasExporter
+    settings["ITEM_PIPELINES"] = {}
+    process = CrawlerProcess(settings=settings)
+    process.crawl(
+        WooCrawlSpider,
+        domain=domain,
+        category=category,
+        config_file=config_file,
+        mode=mode,
+        queue_file=queue_file,
+    )
+    process.start()
+
+
+def coordinator(domain: str, queue_file: str, category: str = "未知分类", config_file: str = None,
+                profile: str = None):
+    os.makedirs(os.path.dirname(os.path.abspath(queue_file)), exist_ok=True)
+    crawl(domain, category, config_file, "coordinator", queue_file, profile)
+
+
+def worker(domain: str, queue_file: str, category: str = "未知分类", config_file: str = None, processes: int = 1,
+           profile: str = None):
+    if processes <= 1:
+        crawl(domain, category, config_file, "worker", queue_file, profile)
+        return
+
+    # 每个进程一个独立的 reactor
+    procs = [
+        Process(target=crawl, args=(domain, category, config_file, "worker", queue_file, profile))
+        for _ in range(processes)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+
+def requeue_failed(queue_file: str):
+    queue = WorkQueue(queue_file)
+    count = queue.requeue_failed()
+    counts = queue.counts()
+    queue.close()
+    print(f"已把 {count} 个失败的 URL 放回队列，队列状态：{counts}")
+
+
+def merge(domain: str, queue_file: str, export_file: str = None):
+    site_name = site_name_of(domain)
+    parts_dir = os.path.dirname(os.path.abspath(queue_file))
+    parts = sorted(glob.glob(os.path.join(parts_dir, f"{site_name}.part-*.jsonl")))
+    if not parts:
+        print(f"没有找到分片文件：{parts_dir}")
+        return
+
+    # 队列没清空或有失败的 URL，导出就是不完整的，要明确提示
+    queue = WorkQueue(queue_file)
+    counts = queue.counts()
+    queue.close()
+    print(f"队列状态：{counts}")
+    if counts.get("pending") or counts.get("claimed"):
+        print("⚠ 还有未完成的 URL，本次合并结果不完整")
+    if counts.get("failed"):
+        print(f"⚠ {counts['failed']} 个 URL 抓取失败，未包含在导出中（可用 requeue-failed 放回队列重抓）")
+
+    fields = build_settings(export_file)["PANDAS_FIELDS"]
+    rows = []
+    for part in parts:
+        with open(part, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    continue  # 写到一半崩溃留下的残行，对应 URL 没标 done，会被重抓
+                rows.append(tuple(item.get(k, "") for k in fields))
+
+    export_file = export_file or f"{site_name}.xlsx"
+    count = write_excel(rows, fields, os.path.abspath(export_file))
+    print(f"\n合并 {len(parts)} 个分片，共 {count} 条数据 → {export_file}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Woo 单站分布式抓取")
+    parser.add_argument("role", choices=["coordinator", "worker", "merge", "requeue-failed"])
+    parser.add_argument("domain", help="站点地图地址，例如 https://koreanskincare.nl/sitemap.xml")
+    parser.add_argument("--queue", required=True, help="共享队列文件（SQLite），分片也写在同一目录")
+    parser.add_argument("--category", default="未知分类")
+    parser.add_argument("--config", default=None, help="selectors 配置文件")
+    parser.add_argument("--processes", type=int, default=1, help="本机 worker 进程数")
+    parser.add_argument("--profile", default=None, help="下载配置档，例如 h2")
+    parser.add_argument("--output", default=None, help="merge 输出文件")
+    args = parser.parse_args()
+
+    if args.role == "coordinator":
+        coordinator(args.domain, args.queue, args.category, args.config, args.profile)
+    elif args.role == "worker":
+        worker(args.domain, args.queue, args.category, args.config, args.processes, args.profile)
+    elif args.role == "requeue-failed":
+        requeue_failed(args.queue)
+    else:
+        merge(args.domain, args.queue, args.output)
@@ -0,0 +1,137 @@
+# download_profiles.py
+# 可选的下载配置档：高并发 Shopify / Woo 站点用 HTTP/2 多路复用，减少重复 TLS 握手
+#
+# 用法：apply_download_profile(settings, "h2")
+# 压缩：HttpCompressionMiddleware 会按已安装的解码库自动声明 gzip/deflate/br/zstd，
+#       装上 brotli 即可声明 br，这里不手动改 Accept-Encoding，避免声明了却解不开
+import logging
+
+from scrapy.core.downloader.handlers.http11 import HTTP11DownloadHandler
+from scrapy.utils.httpobj import urlparse_cached
+from twisted.internet import defer
+from twisted.python.failure import Failure
+
+try:
+    from scrapy.core.downloader.handlers.http2 import H2DownloadHandler
+    from scrapy.core.http2.protocol import InvalidNegotiatedProtocol
+    from scrapy.core.http2.stream import InactiveStreamClosed
+except ImportError:  # 没装 Twisted[http2]
+    H2DownloadHandler = None
+    InvalidNegotiatedProtocol = None
+    InactiveStreamClosed = None
+
+logger = logging.getLogger(__name__)
+
+
+def _not_h2(failure) -> bool:
+    """
+    服务端不说 HTTP/2：
+    - ALPN 协商成了别的协议 → InvalidNegotiatedProtocol
+    - 服务端不回 ALPN（只支持 HTTP/1.1 的服务器通常如此），收到 h2 前导帧直接断开 → InactiveStreamClosed
+    H2 连接池/stream 报的是 ResponseFailed([...])，reasons 里可能是异常实例，也可能是 Failure
+    """
+    errors = (InvalidNegotiatedProtocol, InactiveStreamClosed)
+    if failure.check(*errors):
+        return True
+    for r in getattr(failure.value, "reasons", None) or []:
+        if isinstance(r, Failure):
+            if r.check(*errors):
+                return True
+        elif isinstance(r, errors):
+            return True
+    return False
+
+
+class H2FallbackDownloadHandler:
+    """
+    https 优先走 HTTP/2；服务端不支持 h2 或走代理时回退 HTTP/1.1 长连接池。
+    回退过的 host 记下来，后续请求直接走 HTTP/1.1。
+    """
+    lazy = False
+
+    def __init__(self, settings, crawler):
+        self.stats = crawler.stats
+
+        # HTTP/1.1 连接池每个 host 的上限，默认跟 CONCURRENT_REQUESTS_PER_DOMAIN 一致
+        pool_settings = settings.copy()
+        pool_settings.frozen = False  # copy() 出来的仍是冻结状态，要先解冻才能改
+        per_host = settings.getint("DOWNLOAD_POOL_MAX_PER_HOST", 0)
+        if per_host:
+            pool_settings.set("CONCURRENT_REQUESTS_PER_DOMAIN", per_host)
+        self._h11 = HTTP11DownloadHandler(pool_settings, crawler)
+
+        self._h2 = None
+        if H2DownloadHandler is None:
+            logger.warning("未安装 Twisted[http2]，download profile h2 只使用 HTTP/1.1")
+        else:
+            self._h2 = H2DownloadHandler(settings, crawler)
+        self._h1_hosts = set()
+        self._h2_hosts = set()  # 已确认能走 h2 的 host，之后的失败是真实错误，不再回退
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings, crawler)
+
+    def download_request(self, request, spider):
+        host = urlparse_cached(request).netloc
+        # Scrapy 的 HTTP/2 实现不发 bytes_received 信号，截断下载（WOO_TRUNCATE_ENABLED）只能走 HTTP/1.1
+        if (self._h2 is None or request.meta.get("proxy") or request.meta.get("truncate_download")
+                or host in self._h1_hosts):
+            return self._h11.download_request(request, spider)
+
+        d = self._h2.download_request(request, spider)
+
+        def confirmed(response):
+            self._h2_hosts.add(host)
+            return response
+
+        def fallback(failure):
+            if host in self._h2_hosts or not _not_h2(failure):
+                return failure
+            if host not in self._h1_hosts:
+                self._h1_hosts.add(host)
+                self.stats.inc_value("connection/h2_fallback_hosts")
+                logger.info(f"{host} 不支持 HTTP/2，改用 HTTP/1.1")
+            return self._h11.download_request(request, spider)
+
+        d.addCallbacks(confirmed, fallback)
+        return d
+
+    @defer.inlineCallbacks
+    def close(self):
+        yield self._h11.close()
+        if self._h2 is not None:
+            yield self._h2.close()
+
+
+DOWNLOAD_PROFILES = {
+    # 默认：Scrapy 自带的 HTTP/1.1
+    "default": {},
+
+    # 高扇出：HTTP/2 多路复用 + 连接复用 + 连接级统计
+    "h2": {
+        "DOWNLOAD_HANDLERS": {
+            "https": "ecommerce_spider.download_profiles.H2FallbackDownloadHandler",
+        },
+        "DOWNLOAD_POOL_MAX_PER_HOST": 8,  # 回退到 HTTP/1.1 时每个 host 最多保持的长连接
+        "DOWNLOADER_MIDDLEWARES": {
+            # 放在 HttpCompressionMiddleware(590) 外侧，能看到解压前的响应
+            "ecommerce_spider.middlewares.ConnectionStatsMiddleware": 950,
+        },
+    },
+}
+
+
+def apply_download_profile(settings: dict, profile: str = None) -> dict:
+    """把配置档合并进 settings（dict 类型的配置项按 key 合并）"""
+    profile = profile or "default"
+    if profile not in DOWNLOAD_PROFILES:
+        raise ValueError(f"未知的 download profile：{profile}，可选：{list(DOWNLOAD_PROFILES)}")
+    for key, value in DOWNLOAD_PROFILES[profile].items():
+        if isinstance(value, dict):
+            merged = dict(settings.get(key) or {})
+            merged.update(value)
+            settings[key] = merged
+        else:
+            settings[key] = value
+    return settings
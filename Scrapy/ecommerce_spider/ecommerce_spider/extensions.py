@@ -0,0 +1,180 @@
+# extensions.py
+# 运行中的实时指标：每个 spider 的 items/s、在途请求、响应耗时分位数、错误/重试、调度队列深度、导出缓存条数
+# 通过本地 HTTP 接口（Prometheus 文本格式）或 Prometheus textfile 暴露给监控抓取
+import logging
+import os
+import time
+from collections import deque
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+from twisted.internet.error import CannotListenError
+from twisted.web import resource, server
+
+from ecommerce_spider.sampling import percentile
+
+logger = logging.getLogger(__name__)
+
+# 同一进程里所有 crawler（demo.run_batch 多站共用一个 reactor）共享一个接口
+_registry = []
+_listening_port = None
+
+
+# 指标名 → Prometheus 类型，顺序即输出顺序
+METRIC_TYPES = {
+    "crawler_items_total": "counter",
+    "crawler_items_per_second": "gauge",
+    "crawler_requests_in_flight": "gauge",
+    "crawler_responses_total": "counter",
+    "crawler_errors_total": "counter",
+    "crawler_download_exceptions_total": "counter",
+    "crawler_retries_total": "counter",
+    "crawler_scheduler_queue_depth": "gauge",
+    "crawler_exporter_buffered_items": "gauge",
+    "crawler_response_latency_seconds": "gauge",
+}
+
+
+def render_all() -> str:
+    """
+    Prometheus 文本格式要求同名指标的样本连续出现，且 # TYPE 在前：
+    先收集所有 spider 的样本，再按指标名分组输出
+    """
+    groups = {name: [] for name in METRIC_TYPES}
+    for metrics in _registry:
+        for name, labels, value in metrics.samples():
+            groups[name].append(f"{name}{{{labels}}} {value}")
+
+    lines = []
+    for name, samples in groups.items():
+        if samples:
+            lines.append(f"# TYPE {name} {METRIC_TYPES[name]}")
+            lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+class MetricsResource(resource.Resource):
+    isLeaf = True
+
+    def render_GET(self, request):
+        request.setHeader(b"Content-Type", b"text/plain; version=0.0.4; charset=utf-8")
+        return render_all().encode("utf-8")
+
+
+class MetricsExtension:
+    def __init__(self, crawler, port, textfile, interval, host="127.0.0.1"):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.port = port
+        self.textfile = textfile
+        self.interval = interval
+        self.host = host
+
+        self.spider = None
+        self.latencies = deque(maxlen=1000)  # 最近 1000 个响应的下载耗时
+        self.items_per_sec = 0.0
+        self._last_items = 0
+        self._last_time = None
+        self._loop = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("METRICS_ENABLED", False):
+            raise NotConfigured
+        ext = cls(
+            crawler,
+            port=settings.getint("METRICS_PORT", 0),
+            textfile=settings.get("METRICS_TEXTFILE"),
+            interval=settings.getfloat("METRICS_INTERVAL", 5.0),
+            host=settings.get("METRICS_HOST", "127.0.0.1"),
+        )
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(ext.response_received, signal=signals.response_received)
+        return ext
+
+    def spider_opened(self, spider):
+        from twisted.internet import reactor
+
+        global _listening_port
+        self.spider = spider
+        self._last_time = time.monotonic()
+        _registry.append(self)
+
+        if self.port and _listening_port is None:
+            try:
+                _listening_port = reactor.listenTCP(self.port, server.Site(MetricsResource()), interface=self.host)
+                logger.info(f"实时指标接口：http://{self.host}:{self.port}/metrics")
+            except CannotListenError as e:
+                logger.warning(f"指标端口 {self.port} 监听失败：{e}")
+
+        self._loop = task.LoopingCall(self.tick)
+        self._loop.start(self.interval, now=False)
+
+    def spider_closed(self, spider):
+        if self._loop and self._loop.running:
+            self._loop.stop()
+        # 先写最终状态再注销：单站任务结束后 textfile 里保留的是最后一次的指标
+        self.tick()
+        if self in _registry:
+            _registry.remove(self)
+
+    def response_received(self, response, request, spider):
+        latency = request.meta.get("download_latency")
+        if latency is not None:
+            self.latencies.append(latency)
+
+    def tick(self):
+        now = time.monotonic()
+        items = self.stats.get_value("item_scraped_count", 0)
+        elapsed = now - self._last_time
+        if elapsed > 0:
+            self.items_per_sec = (items - self._last_items) / elapsed
+        self._last_items, self._last_time = items, now
+        if self.textfile:
+            # LoopingCall 遇到异常会直接停掉，写文件失败只记日志
+            try:
+                self.write_textfile()
+            except OSError as e:
+                logger.error(f"写入指标 textfile 失败 {self.textfile}：{e}")
+
+    def write_textfile(self):
+        # 先写临时文件再替换，node_exporter 不会读到半截内容
+        tmp = f"{self.textfile}.{os.getpid()}.tmp"
+        os.makedirs(os.path.dirname(os.path.abspath(self.textfile)), exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(render_all())
+        os.replace(tmp, self.textfile)
+
+    def samples(self) -> list:
+        """[(指标名, 标签, 值), ...]"""
+        if self.spider is None:
+            return []
+        get = self.stats.get_value
+        site = getattr(self.spider, "domain", "")
+        labels = f'spider="{self.spider.name}",site="{site}"'
+        engine = self.crawler.engine
+        in_flight = len(engine.downloader.active) if engine and engine.downloader else 0
+        queue_depth = get("scheduler/enqueued", 0) - get("scheduler/dequeued", 0)
+
+        samples = [
+            ("crawler_items_total", labels, get("item_scraped_count", 0)),
+            ("crawler_items_per_second", labels, f"{self.items_per_sec:.3f}"),
+            ("crawler_requests_in_flight", labels, in_flight),
+            ("crawler_responses_total", labels, get("response_received_count", 0)),
+            ("crawler_errors_total", labels, get("log_count/ERROR", 0)),
+            ("crawler_download_exceptions_total", labels, get("downloader/exception_count", 0)),
+            ("crawler_retries_total", labels, get("retry/count", 0)),
+            ("crawler_scheduler_queue_depth", labels, queue_depth),
+            ("crawler_exporter_buffered_items", labels, get("exporter/buffered_items", 0)),
+        ]
+        latencies = list(self.latencies)
+        for q in (50, 95, 99):
+            samples.append((
+                "crawler_response_latency_seconds",
+                f'{labels},quantile="{q / 100}"',
+                f"{percentile(latencies, q):.4f}",
+            ))
+        return samples
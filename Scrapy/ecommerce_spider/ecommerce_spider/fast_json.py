@@ -0,0 +1,43 @@
+# fast_json.py
+# Shopify 接口 JSON 解码层：直接从 response.body(bytes) 解析，不再先解码成 str
+import io
+import json
+
+try:
+    import orjson  # 可选依赖，比标准库 json 快 3~5 倍
+except ImportError:
+    orjson = None
+
+try:
+    import ijson  # 可选依赖，流式解析超大分页
+except ImportError:
+    ijson = None
+
+
+# 超过这个字节数就改用流式解析（250 条商品、带大段 body_html 的分页一般在几 MB）
+STREAM_THRESHOLD = 2 * 1024 * 1024
+
+
+def loads(body: bytes):
+    """bytes -> python 对象，优先 orjson，没有就退回标准库"""
+    if orjson is not None:
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            # orjson 更严格（例如孤立的 \ud83d 代理项），标准库能解析的不能因此丢整页
+            pass
+    return json.loads(body)
+
+
+def iter_items(body: bytes, key: str, stream_threshold: int = STREAM_THRESHOLD):
+    """
+    逐个产出 body 中 key 对应数组的元素。
+    小页面整页解析（orjson 更快），大页面且装了 ijson 时边解析边产出，
+    不会一次性在内存里建出整棵对象树。
+    """
+    if ijson is not None and stream_threshold and len(body) > stream_threshold:
+        yield from ijson.items(io.BytesIO(body), f"{key}.item", use_float=True)
+        return
+
+    data = loads(body)
+    yield from data.get(key) or []
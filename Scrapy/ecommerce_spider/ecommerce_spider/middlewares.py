@@ -114,4 +114,32 @@ class CustomUserAgentMiddleware:
 
     def process_request(self, request, spider):
         """为每个请求随机添加User-Agent"""
-        request.headers['User-Agent'] = random.choice(self.USER_AGENTS)
\ No newline at end of file
+        request.headers['User-Agent'] = random.choice(self.USER_AGENTS)
+
+
+class ConnectionStatsMiddleware:
+    """连接级统计：协议（h2 / HTTP/1.1）、内容编码、线上字节数、下载耗时，写进 crawler.stats"""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats)
+
+    def process_response(self, request, response, spider):
+        protocol = getattr(response, "protocol", None) or "unknown"
+        self.stats.inc_value(f"connection/protocol/{protocol}")
+
+        encoding = response.headers.get("Content-Encoding", b"identity").decode("latin-1")
+        self.stats.inc_value(f"connection/content_encoding/{encoding}")
+        self.stats.inc_value("connection/wire_bytes", len(response.body))
+
+        if response.ip_address:
+            self.stats.inc_value(f"connection/remote/{response.ip_address}")
+
+        latency = request.meta.get("download_latency")
+        if latency is not None:
+            self.stats.inc_value("connection/download_latency_total", latency)
+            self.stats.max_value("connection/download_latency_max", latency)
+        return response
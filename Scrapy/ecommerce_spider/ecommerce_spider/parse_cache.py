@@ -0,0 +1,89 @@
+# parse_cache.py
+# 解析结果缓存：(URL, 页面内容 hash, selectors 配置 hash) → 上次提取出的 item
+# 页面没变、配置没变就直接复用，跳过 XPath / 价格正则 / BeautifulSoup
+#
+# 分布式模式下同一台机器的多个 worker 共用一个缓存文件：WAL + 每次写入立即提交，
+# 锁等待超时按未命中 / 跳过写入处理，缓存出问题绝不能影响抓取结果
+#
+# 注意：SQLite 的 WAL 要求所有连接在同一台主机上，且不能放在网络文件系统（NFS/SMB）上。
+# 爬虫按主机名给每台机器单独一个缓存文件；PARSE_CACHE_DIR 应指向本地磁盘
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+
+def body_hash(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def config_hash(config) -> str:
+    raw = json.dumps(config, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.md5(raw.encode("utf-8")).hexdigest()
+
+
+class ParseCache:
+    def __init__(self, path: str, config_key: str, timeout: float = 30.0):
+        self.path = path
+        self.config_key = config_key
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # isolation_level=None：每条语句自动提交，不会长时间占着写锁
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS items (
+                url         TEXT PRIMARY KEY,
+                body_hash   TEXT NOT NULL,
+                config_hash TEXT NOT NULL,
+                item        TEXT NOT NULL
+            )
+            """
+        )
+        # selectors 配置变了，旧结果全部作废
+        try:
+            self.purged = self.conn.execute(
+                "DELETE FROM items WHERE config_hash != ?", (config_key,)
+            ).rowcount
+        except sqlite3.OperationalError as e:
+            # 别的 worker 正在清，查询时 config_hash 条件本身就会过滤掉旧结果
+            logger.warning(f"清理旧解析缓存失败：{e}")
+            self.purged = 0
+
+    def get(self, url: str, digest: str):
+        try:
+            row = self.conn.execute(
+                "SELECT item FROM items WHERE url = ? AND body_hash = ? AND config_hash = ?",
+                (url, digest, self.config_key),
+            ).fetchone()
+        except sqlite3.OperationalError as e:
+            # 锁超时之类：当作未命中，照常解析
+            self.errors += 1
+            logger.warning(f"读取解析缓存失败，按未命中处理：{e}")
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, url: str, digest: str, item: dict):
+        try:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO items(url, body_hash, config_hash, item) VALUES (?, ?, ?, ?)",
+                (url, digest, self.config_key, json.dumps(item, ensure_ascii=False)),
+            )
+        except sqlite3.OperationalError as e:
+            # 写不进去只是少一条缓存，item 照常产出
+            self.errors += 1
+            logger.warning(f"写入解析缓存失败，跳过：{e}")
+
+    def close(self):
+        self.conn.close()
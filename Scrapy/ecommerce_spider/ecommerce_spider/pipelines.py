@@ -1,13 +1,171 @@
 # pipelines.py
 import pandas as pd
+import multiprocessing
 import os
+import pickle
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from scrapy.exceptions import NotConfigured, CloseSpider
+from twisted.internet.defer import Deferred
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.failure import Failure
+from twisted.python.threadpool import ThreadPool
+
+
+def write_excel(rows, fields, file_name):
+    """构建 DataFrame 并写 Excel，返回导出条数。模块级函数，方便丢到子进程里跑
+    rows 是按 fields 顺序排列的 tuple
+    """
+    df = pd.DataFrame.from_records(rows, columns=fields)
+    df = df.drop_duplicates(subset=["SKU"], keep="first")
+
+    # 确保目录存在
+    os.makedirs(os.path.dirname(file_name) or '.', exist_ok=True)
+
+    # 最简单、最稳定、无兼容性问题的写法
+    with pd.ExcelWriter(file_name, engine='openpyxl') as writer:
+        df.to_excel(writer, sheet_name='商品数据', index=False)
+    return len(df)
+
+
+def write_excel_from_file(rows_file, fields, file_name):
+    with open(rows_file, "rb") as f:
+        rows = pickle.load(f)
+    return write_excel(rows, fields, file_name)
+
+
+_export_pool = None
+_export_threads = None
+_export_pool_lock = threading.Lock()
+
+
+def export_pool(max_workers=2):
+    """
+    整个进程共用一个导出进程池，懒创建；大小以第一次创建时为准。
+    不能用 Linux 默认的 fork：这里是在多线程的 Twisted 进程里发起的，fork 出来的子进程可能死锁。
+    用 spawn：各平台行为一致，且会把父进程的 sys.path 带给子进程，子进程能正常 import 本项目
+    """
+    global _export_pool
+    with _export_pool_lock:
+        if _export_pool is None:
+            _export_pool = ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _export_pool
+
+
+def export_threads(max_threads=2):
+    """
+    导出专用的线程池，懒创建，reactor 关闭时停掉。
+    不占 reactor 默认线程池：那是 DNS 解析等共用的，大站导出要跑好几分钟，别把它堵住
+    """
+    global _export_threads
+    from twisted.internet import reactor
+
+    with _export_pool_lock:
+        if _export_threads is None:
+            _export_threads = ThreadPool(minthreads=0, maxthreads=max_threads, name="pandas-export")
+            _export_threads.start()
+            reactor.addSystemEventTrigger("during", "shutdown", _export_threads.stop)
+        return _export_threads
+
+
+def dump_rows(rows, out_dir):
+    """rows 流式写进 out_dir 下的临时文件后清空，返回文件路径"""
+    os.makedirs(out_dir, exist_ok=True)
+    fd, rows_file = tempfile.mkstemp(prefix="export-", suffix=".pkl", dir=out_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(rows, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except BaseException:
+        os.remove(rows_file)
+        raise
+    rows.clear()
+    return rows_file
+
+
+def write_excel_in_process(rows, fields, file_name):
+    """
+    同步版本：大站导出很吃 CPU，放子进程里跑，不和 reactor 抢 GIL。
+    rows 先写进临时文件再清空，子进程从文件读：
+    父进程不会同时持有 rows 和一份完整的序列化副本，内存峰值基本只在子进程（约一份 rows + DataFrame）
+    """
+    rows_file = dump_rows(rows, os.path.dirname(file_name) or ".")
+    try:
+        return export_pool().submit(write_excel_from_file, rows_file, fields, file_name).result()
+    finally:
+        os.remove(rows_file)
+
+
+def future_to_deferred(future):
+    """concurrent.futures.Future → Deferred，结果回到 reactor 线程；不依赖 asyncio reactor"""
+    from twisted.internet import reactor
+
+    d = Deferred()
+
+    def done(f):
+        try:
+            result = f.result()
+        except BaseException as e:
+            reactor.callFromThread(d.errback, Failure(e))
+        else:
+            reactor.callFromThread(d.callback, result)
+
+    future.add_done_callback(done)
+    return d
+
+
+def export_deferred(rows, fields, file_name, executor="thread", processes=2, threads=2):
+    """
+    异步导出，返回 Deferred（结果是导出条数），不阻塞任何共用线程：
+    - thread：整个导出跑在导出专用线程池
+    - process：只有序列化 rows 在导出线程池里做（秒级），交给子进程后线程就还回去，
+      在 reactor 里等子进程的 future，子进程跑多久都不占线程
+    """
+    from twisted.internet import reactor
+
+    pool = export_threads(threads)
+    if executor != "process":
+        return deferToThreadPool(reactor, pool, write_excel, rows, fields, file_name)
+
+    d = deferToThreadPool(reactor, pool, dump_rows, rows, os.path.dirname(file_name) or ".")
+
+    def submit(rows_file):
+        future = export_pool(processes).submit(write_excel_from_file, rows_file, fields, file_name)
+        wd = future_to_deferred(future)
+
+        def cleanup(result):
+            os.remove(rows_file)
+            return result
+
+        return wd.addBoth(cleanup)
+
+    return d.addCallback(submit)
+
+
+# 自定义信号：下载已全部结束、开始导出时发出（spider_closed 要等导出完成才发），
+# 批量调度可以据此提前启动下一个站点
+export_started = object()
+
+
+# 同一商品的多个变体重复的大字段（描述动辄几十 KB），只存一份
+SHARED_FIELDS = ["Description", "Categories", "自定义分类", "原站域名"]
+
 
 class PandasExporter:
-    def __init__(self, file_name, fields):
+    def __init__(self, file_name, fields, executor="thread", stats=None, shared_fields=SHARED_FIELDS,
+                 processes=2, threads=2, signals=None):
         self.file_name = os.path.abspath(file_name)      # 绝对路径，日志好看
         self.fields = fields
-        self.items = []                                  # 所有数据都攒在这里
+        self.executor = executor                         # thread / process
+        self.processes = processes                       # 导出进程池大小（整个进程共用，以第一次创建为准）
+        self.threads = threads                           # 导出线程池大小（同上）
+        self.signals = signals                           # crawler.signals，发 export_started
+        self.items = []                                  # 所有数据都攒在这里（按 fields 顺序的 tuple，比 dict 省内存）
+        self.stats = stats                               # 缓存条数写进 stats，供实时指标读取
+        self.shared = [k in shared_fields for k in fields]
+        self.pool = {}                                   # 字符串池：内容相同的字符串全部指向同一个对象
 
     @classmethod
     def from_crawler(cls, crawler):
@@ -15,43 +173,52 @@ class PandasExporter:
         fields = crawler.settings.get("PANDAS_FIELDS")
         if not file_name or not fields:
             raise NotConfigured("settings里没配置 PANDAS_EXPORT_FILE 或 PANDAS_FIELDS")
-        return cls(file_name, fields)
+        executor = crawler.settings.get("PANDAS_EXPORT_EXECUTOR", "thread")
+        shared_fields = crawler.settings.getlist("PANDAS_SHARED_FIELDS", SHARED_FIELDS)
+        processes = crawler.settings.getint("PANDAS_EXPORT_PROCESSES", 2)
+        threads = crawler.settings.getint("PANDAS_EXPORT_THREADS", 2)
+        return cls(file_name, fields, executor, crawler.stats, shared_fields, processes, threads, crawler.signals)
 
     def open_spider(self, spider):
         self.file_name = spider.export_file
     def process_item(self, item, spider):
-        # 只保留我们关心的字段 + 转成普通 dict
-        row = {k: item.get(k, "") for k in self.fields}
+        # 只保留我们关心的字段，按 fields 顺序存成 tuple；
+        # 共享字段走字符串池，100 个变体引用同一份描述，内存随商品数而不是变体数增长
+        pool = self.pool
+        row = tuple(
+            pool.setdefault(v, v) if shared and isinstance(v, str) else v
+            for v, shared in zip((item.get(k, "") for k in self.fields), self.shared)
+        )
         self.items.append(row)
 
         # 进度提示
         count = len(self.items)
+        if self.stats is not None:
+            self.stats.set_value("exporter/buffered_items", count)
         if count % 100 == 0:
             spider.logger.info(f"已缓存 {count} 条数据到内存，待导出...")
         return item
 
     def close_spider(self, spider):
+        if self.signals is not None:
+            self.signals.send_catch_log(signal=export_started, spider=spider)
         if not self.items:
             spider.logger.info("没有抓到任何数据，跳过导出")
             return
 
-        try:
-            df = pd.DataFrame(self.items)
-            for field in self.fields:
-                if field not in df.columns:
-                    df[field] = ""
-            df = df[self.fields]
-            df = df.drop_duplicates(subset=["SKU"], keep="first")
-
-            # 确保目录存在
-            os.makedirs(os.path.dirname(self.file_name) or '.', exist_ok=True)
+        # 导出返回 Deferred：同一 reactor 上的其他站点照常下载，本 spider 等导出完成才算关闭
+        rows, self.items = self.items, []
+        self.pool = {}
+        if self.stats is not None:
+            self.stats.set_value("exporter/buffered_items", 0)
+        d = export_deferred(rows, self.fields, self.file_name, self.executor, self.processes, self.threads)
 
-            # 最简单、最稳定、无兼容性问题的写法
-            with pd.ExcelWriter(self.file_name, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='商品数据', index=False)
+        def exported(count):
+            spider.logger.info(f"成功导出 {count} 条数据 → {self.file_name}")
 
-            spider.logger.info(f"成功导出 {len(df)} 条数据 → {self.file_name}")
+        def failed(failure):
+            spider.logger.error(f"导出彻底失败：{failure.value}")
+            raise CloseSpider(f"Excel导出失败：{failure.value}")
 
-        except Exception as e:
-            spider.logger.error(f"导出彻底失败：{e}")
-            raise CloseSpider(f"Excel导出失败：{e}")
\ No newline at end of file
+        d.addCallbacks(exported, failed)
+        return d
@@ -0,0 +1,90 @@
+# sampling.py
+# 抽样试跑：从站点地图分层随机抽一小批商品页跑提取，统计各字段命中率，快速验证 selectors 配置
+import random
+
+
+def stratified_sample(strata: dict, size: int, seed=None) -> list:
+    """
+    strata: {站点地图URL: [商品URL, ...]}
+    按每个站点地图的商品数量占比分配名额（每层至少 1 个），层内随机抽取
+    """
+    rng = random.Random(seed)
+    total = sum(len(urls) for urls in strata.values())
+    if total <= size:
+        return [u for urls in strata.values() for u in urls]
+
+    picked = []
+    for urls in strata.values():
+        if not urls:
+            continue
+        quota = min(len(urls), max(1, round(size * len(urls) / total)))
+        picked.extend(rng.sample(urls, quota))
+
+    # 每层至少 1 个可能超出总名额，随机裁掉多余的
+    if len(picked) > size:
+        picked = rng.sample(picked, size)
+    return picked
+
+
+def percentile(values, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+
+class SampleReport:
+    """收集抽样页面的字段命中、价格解析失败和耗时"""
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.pages = 0
+        self.errors = []          # (url, 错误)
+        self.filled = {f: 0 for f in fields}
+        self.price_failures = []  # (url, 抓到的原始价格文本)
+        self.parse_times = []
+        self.download_times = []
+
+    def record(self, url, found: dict, price_texts, parse_time, download_time=None):
+        self.pages += 1
+        for field in self.fields:
+            if found.get(field):
+                self.filled[field] += 1
+        if not found.get("price"):
+            self.price_failures.append((url, price_texts))
+        self.parse_times.append(parse_time)
+        if download_time is not None:
+            self.download_times.append(download_time)
+
+    def record_error(self, url, error):
+        self.errors.append((url, error))
+
+    def lines(self) -> list:
+        lines = [f"抽样页面：{self.pages}，解析异常：{len(self.errors)}"]
+        if self.pages:
+            lines.append("字段命中率：")
+            for field in self.fields:
+                rate = self.filled[field] / self.pages
+                lines.append(f"  {field:<12} {rate:6.1%} ({self.filled[field]}/{self.pages})")
+        lines.append(f"价格解析失败：{len(self.price_failures)}")
+        for url, texts in self.price_failures[:10]:
+            lines.append(f"  {url} → {texts[:3]}")
+        for url, error in self.errors[:10]:
+            lines.append(f"  异常 {url} → {error}")
+        lines.append(
+            "解析耗时(ms)：p50={:.1f} p95={:.1f} max={:.1f}".format(
+                percentile(self.parse_times, 50) * 1000,
+                percentile(self.parse_times, 95) * 1000,
+                max(self.parse_times, default=0) * 1000,
+            )
+        )
+        if self.download_times:
+            lines.append(
+                "下载耗时(s)：p50={:.2f} p95={:.2f} max={:.2f}".format(
+                    percentile(self.download_times, 50),
+                    percentile(self.download_times, 95),
+                    max(self.download_times),
+                )
+            )
+        return lines
@@ -0,0 +1,147 @@
+# selector_learner.py
+# 选择器自动收窄：预热阶段记录 "a | b | c" 并集里真正命中的分支，
+# 之后只跑命中的分支，取不到再回退到完整并集
+import hashlib
+import json
+import os
+
+
+def split_union(expr: str) -> list:
+    """按顶层 | 拆分 XPath 并集，忽略括号/方括号/引号里的 |"""
+    branches = []
+    depth = 0
+    quote = None
+    start = 0
+    for i, ch in enumerate(expr):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in ("'", '"'):
+            quote = ch
+        elif ch in "([":
+            depth += 1
+        elif ch in ")]":
+            depth -= 1
+        elif ch == "|" and depth == 0:
+            branches.append(expr[start:i].strip())
+            start = i + 1
+    branches.append(expr[start:].strip())
+    return [b for b in branches if b]
+
+
+def expr_hash(expr: str) -> str:
+    return hashlib.md5(expr.encode("utf-8")).hexdigest()
+
+
+class SelectorLearner:
+    """按字段学习每个站点真正生效的 XPath 分支"""
+
+    def __init__(self, selectors: dict, fields, learned_file: str, warmup: int = 200, logger=None):
+        self.selectors = selectors
+        self.learned_file = learned_file
+        self.warmup = warmup
+        self.logger = logger
+
+        self.branches = {}   # 字段 -> 拆开后的分支列表
+        self.hits = {}       # 字段 -> 每个分支的命中次数
+        self.pages = {}      # 字段 -> 预热阶段已看过的页面数
+        self.narrowed = {}   # 字段 -> 收窄后的表达式
+        self.fallbacks = {}  # 字段 -> 收窄后回退到完整并集的次数
+
+        for field in fields:
+            expr = selectors.get(field)
+            if not expr:
+                continue
+            branches = split_union(expr)
+            if len(branches) < 2:
+                continue  # 单分支没有可收窄的
+            self.branches[field] = branches
+            self.hits[field] = [0] * len(branches)
+            self.pages[field] = 0
+            self.fallbacks[field] = 0
+
+        self.load()
+
+    # ---------- 持久化 ----------
+
+    def load(self):
+        if not self.learned_file or not os.path.exists(self.learned_file):
+            return
+        try:
+            with open(self.learned_file, "r", encoding="utf-8") as f:
+                learned = json.load(f)
+        except Exception as e:
+            self._log("warning", f"读取已学习的 selectors 失败：{e}")
+            return
+
+        for field, entry in learned.items():
+            if field not in self.branches:
+                continue
+            # selectors 配置改过就作废，重新学习
+            if entry.get("full_hash") != expr_hash(self.selectors[field]):
+                continue
+            self.narrowed[field] = entry["narrowed"]
+        if self.narrowed:
+            self._log("info", f"加载已学习的 selectors：{self.learned_file} → {list(self.narrowed)}")
+
+    def save(self):
+        if not self.learned_file or not self.narrowed:
+            return
+        learned = {
+            field: {
+                "full_hash": expr_hash(self.selectors[field]),
+                "narrowed": narrowed,
+            }
+            for field, narrowed in self.narrowed.items()
+        }
+        os.makedirs(os.path.dirname(self.learned_file) or ".", exist_ok=True)
+        # 先写临时文件再原子替换：并发的 spider 或中途崩溃都不会留下半个 JSON
+        tmp = f"{self.learned_file}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(learned, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.learned_file)
+        self._log("info", f"已保存学习到的 selectors → {self.learned_file}")
+
+    # ---------- 取值 ----------
+
+    def xpath(self, response, field):
+        full = self.selectors[field]
+        if field not in self.branches:
+            return response.xpath(full)
+
+        narrowed = self.narrowed.get(field)
+        if narrowed:
+            result = response.xpath(narrowed)
+            if result:
+                return result
+            # 没取到，回退完整并集
+            self.fallbacks[field] += 1
+            return response.xpath(full)
+
+        # 预热阶段：逐个分支记录命中情况，返回值仍用完整并集保证结果不变
+        hits = self.hits[field]
+        for i, branch in enumerate(self.branches[field]):
+            if response.xpath(branch):
+                hits[i] += 1
+        self.pages[field] += 1
+        if self.pages[field] >= self.warmup:
+            self.finish_warmup(field)
+        return response.xpath(full)
+
+    def finish_warmup(self, field):
+        winners = [b for b, n in zip(self.branches[field], self.hits[field]) if n]
+        if not winners:
+            # 一个都没命中，这个字段不再学习，直接用完整并集
+            del self.branches[field]
+            return
+        self.narrowed[field] = " | ".join(winners)
+        self._log("info", f"selector [{field}] 收窄为：{self.narrowed[field]}")
+        if all(f in self.narrowed for f in self.branches):
+            self.save()
+
+    def summary(self) -> dict:
+        return {field: n for field, n in self.fallbacks.items() if n}
+
+    def _log(self, level, msg):
+        if self.logger:
+            getattr(self.logger, level)(msg)
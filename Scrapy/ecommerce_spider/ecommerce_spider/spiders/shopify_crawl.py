@@ -1,7 +1,11 @@
 import hashlib
 import json
 import os
+import time
 import scrapy
+from scrapy.exceptions import CloseSpider
+
+from ecommerce_spider import fast_json
 
 
 class ShopifyCrawlFastSpider(scrapy.Spider):
@@ -41,7 +45,8 @@ class ShopifyCrawlFastSpider(scrapy.Spider):
         "ROBOTSTXT_OBEY": False,
     }
 
-    def __init__(self, domain=None, category="未知分类",export_file=None, *args, **kwargs):
+    def __init__(self, domain=None, category="未知分类",export_file=None,
+                 max_items=None, max_seconds=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
         if not domain or not domain.startswith("http"):
@@ -49,6 +54,7 @@ class ShopifyCrawlFastSpider(scrapy.Spider):
         self.export_file = export_file
 
         self.domain = domain.rstrip("/")
+        self.shop_host = self.domain.split("//")[1]  # 每个变体都引用同一个字符串，不再逐行 split
         self.custom_category = category.strip() or "未知分类"
 
         self.allowed_domains = [
@@ -60,6 +66,12 @@ class ShopifyCrawlFastSpider(scrapy.Spider):
         self.page = 1
         self.limit = 250
 
+        # 单站预算（可选）：条数或时长超了就提前结束，由 demo.run_batch 按站点配置传入
+        self.max_items = int(max_items) if max_items else None
+        self.max_seconds = float(max_seconds) if max_seconds else None
+        self.started_at = time.monotonic()
+        self.item_count = 0
+
         self.shop_currency = "USD"
         self.exchange_rates = {}
         base_dir = os.path.dirname(os.path.abspath(__file__))
@@ -102,7 +114,7 @@ class ShopifyCrawlFastSpider(scrapy.Spider):
 
     def parse_meta(self, response):
         try:
-            self.shop_currency = json.loads(response.text).get("currency", "USD").upper()
+            self.shop_currency = fast_json.loads(response.body).get("currency", "USD").upper()
             self.logger.info(f"币种={self.shop_currency}, 汇率={self.exchange_rates.get(self.shop_currency)}")
 
         except Exception:
@@ -122,16 +134,18 @@ class ShopifyCrawlFastSpider(scrapy.Spider):
         yield scrapy.Request(url, callback=self.parse_products, dont_filter=True)
 
     def parse_products(self, response):
-        data = json.loads(response.text)
-        products = data.get("products", [])
+        if self.max_seconds and time.monotonic() - self.started_at > self.max_seconds:
+            raise CloseSpider("time_budget")
 
-        if not products:
-            self.logger.info("商品抓取完成")
-            return
+        # 直接解析 bytes；超大分页走流式解析，边解析边产出
+        threshold = self.settings.getint("SHOPIFY_JSON_STREAM_THRESHOLD", fast_json.STREAM_THRESHOLD)
+        products = fast_json.iter_items(response.body, "products", threshold)
 
         rate = self.exchange_rates.get(self.shop_currency, 1.0)
+        product_count = 0
 
         for product in products:
+            product_count += 1
             title = product.get("title", "")
             desc = product.get("body_html", "")
             category = product.get("product_type")
@@ -163,12 +177,20 @@ class ShopifyCrawlFastSpider(scrapy.Spider):
                     "Images": variant_image,
                     "cf_opingts": "",
                     "自定义分类": self.custom_category,
-                    "原站域名": self.domain.split("//")[1],
+                    "原站域名": self.shop_host,
                     "分布网站识别": 0,
                     "语言": "en",
                 }
 
-        if len(products) == self.limit:
+                self.item_count += 1
+                if self.max_items and self.item_count >= self.max_items:
+                    raise CloseSpider("item_budget")
+
+        if not product_count:
+            self.logger.info("商品抓取完成")
+            return
+
+        if product_count == self.limit:
             self.page += 1
             yield from self.request_page()
         else:
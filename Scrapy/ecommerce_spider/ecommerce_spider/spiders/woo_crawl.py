@@ -1,11 +1,22 @@
 import hashlib
 import json
 import os
+import socket
+import time
 import scrapy
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider, StopDownload
 from datetime import datetime
 from urllib.parse import urlparse
 import re
 from bs4 import BeautifulSoup
+
+from ecommerce_spider.parse_cache import ParseCache, body_hash, config_hash
+from ecommerce_spider.sampling import SampleReport, stratified_sample
+from ecommerce_spider.selector_learner import SelectorLearner
+from ecommerce_spider.work_queue import WorkQueue
+
+
 class WooCrawlSpider(scrapy.Spider):
     name = "woo_crawl"
 
@@ -32,7 +43,15 @@ class WooCrawlSpider(scrapy.Spider):
         "软件": "SOFT",
         "饮食/烟酒": "FOOD",
     }
-    def __init__(self, domain=None, category="未知分类", config_file=None, *args, **kwargs):
+
+    # 参与自动收窄的字段（site_map 只用一次，不需要学习）
+    LEARNED_FIELDS = [
+        "title", "sku", "price", "description", "images",
+        "breadcrumb_links", "breadcrumb_last",
+    ]
+
+    def __init__(self, domain=None, category="未知分类", config_file=None,
+                 mode=None, queue_file=None, worker_id=None, sample_size=30, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
         # 动态传入的域名和分类
@@ -52,6 +71,33 @@ class WooCrawlSpider(scrapy.Spider):
 
         self.seen_handles = set()  # 防重
         self.seen_product_urls = set()  # 商品URL去重
+        self.site_name = site_name
+        self.selector_learner = None  # start() 里按 settings 初始化
+        self.parse_cache = None  # 同上
+
+        # ==== 分布式模式：coordinator 只解析站点地图写队列，worker 从队列领 URL 抓详情 ====
+        self.mode = mode
+        self.work_queue = None
+        if mode in ("coordinator", "worker"):
+            if not queue_file:
+                raise ValueError("分布式模式必须传入 queue_file")
+            self.work_queue = WorkQueue(queue_file)
+            self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+            if mode == "worker":
+                # 每个 worker 写自己的分片文件（JSON lines），每批处理完追加落盘后才在队列里标记 done，
+                # 最后由 merge 合并去重
+                parts_dir = os.path.dirname(os.path.abspath(queue_file))
+                self.part_file = os.path.join(parts_dir, f"{site_name}.part-{self.worker_id}.jsonl")
+                self.batch_items = []      # (队列URL, item)
+                self.batch_failed = set()  # 下载或解析失败的队列URL
+        elif mode == "sample":
+            # 抽样试跑：先收集全部站点地图，再分层抽 sample_size 个商品页
+            self.sample_size = int(sample_size)
+            self.sample_strata = {}
+            self.sample_drawn = False
+            self.sample_report = SampleReport(["title", "sku", "price", "description", "images", "categories"])
+        elif mode:
+            raise ValueError(f"未知的 mode：{mode}")
 
         # 新增：加载汇率文件
         self.exchange_rates = {}  # 默认至少有 USD
@@ -137,8 +183,64 @@ class WooCrawlSpider(scrapy.Spider):
         else:
             self.logger.warning(f"当前工作目录: {os.getcwd()}")
             self.logger.warning(f"蜘蛛文件目录: {os.path.dirname(os.path.abspath(__file__))}")
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+
+        # ==== 截断下载：详情页读到标记或字节上限就停止，只解析前半段 ====
+        settings = crawler.settings
+        spider.truncate_enabled = settings.getbool("WOO_TRUNCATE_ENABLED", False)
+        spider.truncate_max_bytes = settings.getint("WOO_TRUNCATE_MAX_BYTES", 256 * 1024)
+        marker = spider.selectors.get("truncate_marker") or settings.get("WOO_TRUNCATE_MARKER", "")
+        spider.truncate_marker = marker.encode("utf-8")
+        spider.truncate_required = settings.getlist("WOO_TRUNCATE_REQUIRED", ["title", "price"])
+        if spider.truncate_enabled:
+            crawler.signals.connect(spider.on_bytes_received, signal=signals.bytes_received)
+
+        if spider.mode == "worker":
+            # 每批领得少一些，各 worker 之间更均衡；队列里还会再按活跃 worker 数封顶
+            spider.queue_batch = settings.getint("WORK_QUEUE_BATCH", 20)
+            spider.work_queue.max_attempts = settings.getint("WORK_QUEUE_MAX_ATTEMPTS", 3)
+            spider.queue_stale_secs = settings.getint("WORK_QUEUE_STALE_SECS", 1800)
+            crawler.signals.connect(spider.on_idle, signal=signals.spider_idle)
+        elif spider.mode == "sample":
+            crawler.signals.connect(spider.on_sample_idle, signal=signals.spider_idle)
+        return spider
+
     # 修复：使用Scrapy 2.13+推荐的start()方法（替代start_requests）
     async def start(self):
+        if self.settings.getbool("SELECTOR_LEARNING_ENABLED", False):
+            learn_dir = self.settings.get("SELECTOR_LEARNING_DIR", "configs/selectors_learned")
+            self.selector_learner = SelectorLearner(
+                self.selectors,
+                self.LEARNED_FIELDS,
+                learned_file=os.path.join(learn_dir, f"{self.site_name}.json"),
+                warmup=self.settings.getint("SELECTOR_LEARNING_WARMUP", 200),
+                logger=self.logger,
+            )
+
+        if self.settings.getbool("PARSE_CACHE_ENABLED", False) and self.mode != "sample":
+            cache_dir = self.settings.get("PARSE_CACHE_DIR", ".scrapy/parse_cache")
+            currency = self.selectors.get("currency")
+            # 影响提取结果的配置都算进 hash，任何一项变了缓存自动作废
+            cache_key = config_hash({
+                "selectors": self.selectors,
+                "rate": self.exchange_rates.get(currency, 1.0),
+                "category": self.custom_category,
+            })
+            # 按主机名分目录：多台机器共享项目目录时各自一个库，WAL 不能跨主机/网络文件系统共用
+            cache_file = os.path.join(cache_dir, socket.gethostname(), f"{self.site_name}.db")
+            self.parse_cache = ParseCache(cache_file, cache_key)
+            if self.parse_cache.purged:
+                self.logger.info(f"selectors 配置已变更，清除 {self.parse_cache.purged} 条解析缓存")
+
+        if self.mode == "worker":
+            # worker 不读站点地图，直接从队列领第一批，后续批次在 spider_idle 里补
+            for url in self.work_queue.claim(self.worker_id, self.queue_batch):
+                yield self.detail_request(url, truncate=self.truncate_enabled)
+            return
+
         yield scrapy.Request(
             url=self.domain,
             callback=self.parse_meta_currency,
@@ -177,6 +279,23 @@ class WooCrawlSpider(scrapy.Spider):
             '//*[local-name()="url"]/*[local-name()="loc"]/text()'
         ).extract()
 
+        if self.mode == "coordinator":
+            # 只写队列，不抓详情
+            urls = {u.strip() for u in product_urls if u.strip()}
+            added = self.work_queue.add_urls(urls)
+            self.logger.info(f"从站点地图写入队列 {added} 个新商品URL（本页 {len(urls)} 个）")
+            return
+
+        if self.mode == "sample":
+            # 按站点地图分层收集，等全部站点地图读完（spider_idle）再抽样
+            stratum = self.sample_strata.setdefault(response.url, [])
+            for url in product_urls:
+                url = url.strip()
+                if url and url not in self.seen_product_urls:
+                    self.seen_product_urls.add(url)
+                    stratum.append(url)
+            return
+
         # 去重并发起详情页请求
         valid_count = 0
         for url in product_urls:
@@ -185,14 +304,158 @@ class WooCrawlSpider(scrapy.Spider):
                 self.seen_product_urls.add(url)
                 valid_count += 1
                 # 发起商品详情页请求
-                yield scrapy.Request(
-                    url=url,
-                    callback=self.parse_product_detail,
-                    dont_filter=True
-                )
+                yield self.detail_request(url, truncate=self.truncate_enabled)
 
         self.logger.info(f"从站点地图提取到 {valid_count} 个唯一商品URL（总计：{len(self.seen_product_urls)}）")
 
+    def detail_request(self, url, truncate=False, queue_url=None):
+        meta = {}
+        if truncate:
+            meta = {
+                "truncate_download": True,
+                "dont_cache": True,  # 半截页面不能进 HTTP 缓存
+            }
+        if self.mode == "worker":
+            meta["queue_url"] = queue_url or url  # 结算时按队列里的 URL 记账
+        return scrapy.Request(
+            url=url,
+            callback=self.parse_product_detail,
+            errback=self.detail_failed if self.mode == "worker" else None,
+            meta=meta,
+            # 截断模式要看原始字节找标记，不要压缩
+            headers={"Accept-Encoding": "identity"} if truncate else None,
+            dont_filter=True
+        )
+
+    def detail_failed(self, failure):
+        request = failure.request
+        self.logger.error(f"详情页下载失败 {request.url}: {failure.value!r}")
+        self.batch_failed.add(request.meta.get("queue_url", request.url))
+
+    def record_result(self, response, item=None):
+        """worker 模式下记录每个队列 URL 的结果，on_idle 时统一落盘、结算"""
+        if self.mode != "worker":
+            return
+        url = response.meta.get("queue_url", response.url)
+        if item is None:
+            self.batch_failed.add(url)
+        else:
+            self.batch_items.append((url, item))
+
+    def flush_batch(self, settle_unfinished=True):
+        """
+        先把这一批 item 追加写进分片文件并 fsync，再到队列里标 done；
+        失败的、以及（空闲时）领了却没有结果的 URL 放回队列重试，重试次数用完才标 failed。
+        写完分片后、标 done 前崩溃的话，这批会被回收重抓，merge 按 SKU 去重
+        """
+        queue = self.work_queue
+        if self.batch_items:
+            with open(self.part_file, "a", encoding="utf-8") as f:
+                for _, item in self.batch_items:
+                    f.write(json.dumps(item, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            queue.mark_done([url for url, _ in self.batch_items])
+        for url in self.batch_failed:
+            queue.mark_failed(url)
+        if settle_unfinished:
+            queue.fail_unfinished(self.worker_id)
+        self.batch_items = []
+        self.batch_failed = set()
+
+    def on_idle(self, spider):
+        """本进程的请求都跑完了：结算这一批，再从队列领下一批"""
+        if spider is not self:
+            return
+        queue = self.work_queue
+        self.flush_batch()
+
+        urls = queue.claim(self.worker_id, self.queue_batch)
+        if not urls and queue.requeue_stale(self.queue_stale_secs):
+            urls = queue.claim(self.worker_id, self.queue_batch)
+        if urls:
+            for url in urls:
+                self.crawler.engine.crawl(self.detail_request(url, truncate=self.truncate_enabled))
+            raise DontCloseSpider
+
+        counts = queue.counts()
+        # 协调进程还在写队列，或者别的 worker 还有没结算的批次（可能崩溃，等超时回收）
+        if not queue.ingest_done() or counts.get("claimed"):
+            raise DontCloseSpider
+        self.logger.info(f"队列已清空，worker {self.worker_id} 退出：{counts}")
+
+    def on_sample_idle(self, spider):
+        """站点地图都读完了：分层抽样，发起详情页请求"""
+        if spider is not self or self.sample_drawn:
+            return
+        self.sample_drawn = True
+        urls = stratified_sample(self.sample_strata, self.sample_size)
+        self.logger.info(
+            f"从 {len(self.sample_strata)} 个站点地图、{len(self.seen_product_urls)} 个商品URL 中抽样 {len(urls)} 个"
+        )
+        if not urls:
+            return
+        for url in urls:
+            self.crawler.engine.crawl(self.detail_request(url, truncate=self.truncate_enabled))
+        raise DontCloseSpider
+
+    def on_bytes_received(self, data, request, spider):
+        """边下载边检查：命中标记或超过字节上限就停止读取，已收到的部分照常回调"""
+        if spider is not self or not request.meta.get("truncate_download"):
+            return
+
+        size = request.meta.get("truncate_size", 0) + len(data)
+        request.meta["truncate_size"] = size
+
+        if self.truncate_marker:
+            # 带上上一块的尾巴，避免标记被切在两块之间
+            window = request.meta.get("truncate_tail", b"") + data
+            if self.truncate_marker in window:
+                raise StopDownload(fail=False)
+            request.meta["truncate_tail"] = window[-len(self.truncate_marker):]
+
+        if size >= self.truncate_max_bytes:
+            raise StopDownload(fail=False)
+
+    def cache_digest(self, response) -> str:
+        """页面内容 hash；配置了 cache_block 时只 hash 商品区块，避开页面里的随机数/时间戳"""
+        block = self.selectors.get("cache_block")
+        if block:
+            html = "".join(response.xpath(block).getall())
+            if html:
+                return body_hash(html.encode("utf-8"))
+        return body_hash(response.body)
+
+    def select(self, response, field):
+        """按字段取 XPath 结果；开启学习时走收窄后的表达式"""
+        if self.selector_learner:
+            return self.selector_learner.xpath(response, field)
+        return response.xpath(self.selectors[field])
+
+    def closed(self, reason):
+        if self.parse_cache:
+            self.logger.info(
+                f"解析缓存命中 {self.parse_cache.hits}，未命中 {self.parse_cache.misses}，"
+                f"读写失败 {self.parse_cache.errors}"
+            )
+            self.parse_cache.close()
+        if self.mode == "sample":
+            for line in self.sample_report.lines():
+                print(line)
+        if self.work_queue:
+            if self.mode == "worker":
+                # 中途关闭：已有结果的照常落盘结算，还在途的保持 claimed，超时后由其他 worker 回收
+                self.flush_batch(settle_unfinished=reason == "finished")
+            if self.mode == "coordinator" and reason == "finished":
+                self.work_queue.mark_ingest_done()
+                self.logger.info(f"站点地图写入完成：{self.work_queue.counts()}")
+            self.work_queue.close()
+        if self.selector_learner:
+            self.selector_learner.save()
+            fallbacks = self.selector_learner.summary()
+            if fallbacks:
+                self.logger.info(f"收窄 selectors 回退完整并集次数：{fallbacks}")
+
     def category_prefix(self) -> str:
         return self.CATEGORY_SKU_MAP.get(self.custom_category, "GEN")
 
@@ -205,15 +468,26 @@ class WooCrawlSpider(scrapy.Spider):
             self.logger.warning(f"详情页 {response.url} 返回 {response.status}")
             return
 
+        # 页面和配置都没变：直接复用上次的解析结果（截断页面不参与缓存）
+        digest = None
+        if self.parse_cache and "download_stopped" not in response.flags:
+            digest = self.cache_digest(response)
+            cached = self.parse_cache.get(response.url, digest)
+            if cached is not None:
+                self.record_result(response, cached)
+                yield cached
+                return
+
+        parse_started = time.perf_counter()
         try:
             # ====== 基础字段提取 ======
-            name = response.xpath(self.selectors["title"]).get(default="").strip()
+            name = self.select(response, "title").get(default="").strip()
 
             # SKU（原始，可能为空）
-            original_sku = response.xpath(self.selectors["sku"]).get(default="").strip()
+            original_sku = self.select(response, "sku").get(default="").strip()
 
             # Description：必须用 getall() 合并多个文本节点
-            description = response.xpath(self.selectors["description"]).get(default="").strip()
+            description = self.select(response, "description").get(default="").strip()
             if description:
                 soup = BeautifulSoup(description, 'html.parser')
                 # 移除图片、视频、iframe等
@@ -228,7 +502,7 @@ class WooCrawlSpider(scrapy.Spider):
             else:
                 description = ""
             # 主图
-            images = response.xpath(self.selectors["images"]).get(default="").strip()
+            images = self.select(response, "images").get(default="").strip()
 
             # ====== 生成唯一 SKU ======
             # 用 URL 的最后一部分（通常是商品 slug）生成唯一 hash
@@ -247,11 +521,11 @@ class WooCrawlSpider(scrapy.Spider):
                 sku = f"{sku}-{original_hash}"
 
             # ====== 自动面包屑分类 ======
-            breadcrumb_items = response.xpath(self.selectors["breadcrumb_links"]).getall()
+            breadcrumb_items = self.select(response, "breadcrumb_links").getall()
             breadcrumb_items = [item.strip() for item in breadcrumb_items if item.strip()]
 
             # 移除最后一个（通常是商品名）
-            last_crumb = response.xpath(self.selectors["breadcrumb_last"]).get()
+            last_crumb = self.select(response, "breadcrumb_last").get()
             if last_crumb:
                 last_crumb = last_crumb.strip()
                 if last_crumb and breadcrumb_items and breadcrumb_items[-1] == last_crumb:
@@ -270,7 +544,7 @@ class WooCrawlSpider(scrapy.Spider):
 
             final_category = categories_from_breadcrumb
 
-            price_texts = response.xpath(self.selectors["price"]).getall()
+            price_texts = self.select(response, "price").getall()
             price_texts = [t.strip() for t in price_texts if t.strip()]  # 清理空字符串
             price_values = set()
             for price_text in price_texts:
@@ -306,6 +580,32 @@ class WooCrawlSpider(scrapy.Spider):
             price_clean = f"{price_num * rate:.2f}"
             self.logger.info(f"当前货币:汇率 {currency}:{rate} - 原价格：{price_num} - 汇率转换后的价格{price_clean}")
 
+            found = {
+                "title": name,
+                "sku": original_sku,
+                "description": description,
+                "images": images,
+                "price": price_num,
+                "categories": final_category != "Others",
+            }
+
+            # ====== 截断页面缺字段：完整重新下载 ======
+            if "download_stopped" in response.flags:
+                missing = [f for f in self.truncate_required if not found.get(f)]
+                if missing:
+                    self.logger.debug(f"截断页面缺少 {missing}，完整重新下载：{response.url}")
+                    yield self.detail_request(
+                        response.url, truncate=False, queue_url=response.meta.get("queue_url")
+                    )
+                    return
+
+            if self.mode == "sample":
+                self.sample_report.record(
+                    response.url, found, price_texts,
+                    parse_time=time.perf_counter() - parse_started,
+                    download_time=response.meta.get("download_latency"),
+                )
+
             # ====== 组装 Item ======
             item = {
                 "SKU": sku,
@@ -329,7 +629,14 @@ class WooCrawlSpider(scrapy.Spider):
                 f"商品URL: {response.url}"
             )
 
+            if digest:
+                self.parse_cache.put(response.url, digest, item)
+
+            self.record_result(response, item)
             yield item
 
         except Exception as e:
-            self.logger.error(f"解析商品详情失败 {response.url}: {repr(e)}")
\ No newline at end of file
+            self.logger.error(f"解析商品详情失败 {response.url}: {repr(e)}")
+            if self.mode == "sample":
+                self.sample_report.record_error(response.url, repr(e))
+            self.record_result(response)
\ No newline at end of file
@@ -0,0 +1,154 @@
+# work_queue.py
+# 单站点分布式抓取用的本地持久化队列（SQLite 文件，不依赖任何外部服务）
+# 协调进程把站点地图里的商品 URL 写进来，多个 worker 进程（可在共享文件系统的多台机器上）领取
+import math
+import sqlite3
+import time
+
+PENDING = "pending"
+CLAIMED = "claimed"
+DONE = "done"
+FAILED = "failed"
+
+MAX_ATTEMPTS = 3  # 每个 URL 最多领取几次，用完还失败才置为 failed
+
+
+class WorkQueue:
+    def __init__(self, path: str, timeout: float = 60.0, max_attempts: int = MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        # isolation_level=None：事务自己用 BEGIN IMMEDIATE 控制，避免多个 worker 抢同一批
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS urls (
+                url        TEXT PRIMARY KEY,
+                status     TEXT NOT NULL DEFAULT 'pending',
+                worker     TEXT,
+                claimed_at REAL,
+                attempts   INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_urls_status ON urls(status);
+            CREATE TABLE IF NOT EXISTS meta (
+                key   TEXT PRIMARY KEY,
+                value TEXT
+            );
+            """
+        )
+
+    def close(self):
+        self.conn.close()
+
+    # ---------- 协调进程 ----------
+
+    def add_urls(self, urls) -> int:
+        """批量写入商品 URL，已存在的忽略，返回新增数量"""
+        before = self.conn.total_changes
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO urls(url) VALUES (?)",
+                ((u,) for u in urls),
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return self.conn.total_changes - before
+
+    def mark_ingest_done(self):
+        self.conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('ingest_done', '1')")
+
+    def ingest_done(self) -> bool:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'ingest_done'").fetchone()
+        return bool(row and row[0] == "1")
+
+    # ---------- worker ----------
+
+    def claim(self, worker: str, limit: int) -> list:
+        """
+        原子地领取一批待抓 URL。
+        每次最多领 pending 数按活跃 worker 平分的一份，队列快空时不会被一个 worker 全部领走、其他 worker 干等
+        """
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            pending = self.conn.execute("SELECT COUNT(*) FROM urls WHERE status = ?", (PENDING,)).fetchone()[0]
+            others = self.conn.execute(
+                "SELECT COUNT(DISTINCT worker) FROM urls WHERE status = ? AND worker != ?", (CLAIMED, worker)
+            ).fetchone()[0]
+            limit = min(limit, max(1, math.ceil(pending / (others + 1))))
+            rows = self.conn.execute(
+                "SELECT url FROM urls WHERE status = ? LIMIT ?", (PENDING, limit)
+            ).fetchall()
+            urls = [r[0] for r in rows]
+            self.conn.executemany(
+                "UPDATE urls SET status = ?, worker = ?, claimed_at = ?, attempts = attempts + 1 WHERE url = ?",
+                ((CLAIMED, worker, time.time(), u) for u in urls),
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return urls
+
+    def mark_done(self, urls):
+        """item 已落盘到分片文件后调用"""
+        self.conn.executemany(
+            "UPDATE urls SET status = ? WHERE url = ? AND status = ?",
+            ((DONE, u, CLAIMED) for u in urls),
+        )
+
+    # 失败的 URL：还有重试次数的放回队列（worker 清空，谁空闲谁领），用完了才置为 failed
+    _RETRY_OR_FAIL = (
+        "UPDATE urls SET status = CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END, "
+        "worker = CASE WHEN attempts < ? THEN NULL ELSE worker END "
+    )
+
+    def mark_failed(self, url: str):
+        self.conn.execute(
+            self._RETRY_OR_FAIL + "WHERE url = ? AND status = ?",
+            (self.max_attempts, self.max_attempts, url, CLAIMED),
+        )
+
+    def fail_unfinished(self, worker: str) -> int:
+        """本 worker 已空闲，领了却既没落盘也没标失败的 URL 按失败处理（放回重试或置为 failed）"""
+        cur = self.conn.execute(
+            self._RETRY_OR_FAIL + "WHERE worker = ? AND status = ?",
+            (self.max_attempts, self.max_attempts, worker, CLAIMED),
+        )
+        return cur.rowcount
+
+    def requeue_failed(self) -> int:
+        """把 failed 的 URL 全部放回队列并清零重试次数（例如被封 IP 之后手动重跑），返回数量"""
+        cur = self.conn.execute(
+            "UPDATE urls SET status = ?, worker = NULL, attempts = 0 WHERE status = ?", (PENDING, FAILED)
+        )
+        return cur.rowcount
+
+    def requeue_stale(self, max_age: float, max_attempts: int = None) -> int:
+        """
+        worker 崩溃后遗留的 claimed 超时回收：还有重试次数的放回队列，
+        已经试了 max_attempts 次的（可能是这个 URL 本身把 worker 搞崩）置为 failed，保证队列能清空
+        """
+        if max_attempts is None:
+            max_attempts = self.max_attempts
+        deadline = time.time() - max_age
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            requeued = self.conn.execute(
+                "UPDATE urls SET status = ?, worker = NULL WHERE status = ? AND claimed_at < ? AND attempts < ?",
+                (PENDING, CLAIMED, deadline, max_attempts),
+            ).rowcount
+            self.conn.execute(
+                "UPDATE urls SET status = ? WHERE status = ? AND claimed_at < ? AND attempts >= ?",
+                (FAILED, CLAIMED, deadline, max_attempts),
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return requeued
+
+    def counts(self) -> dict:
+        rows = self.conn.execute("SELECT status, COUNT(*) FROM urls GROUP BY status").fetchall()
+        return dict(rows)
@@ -1,17 +1,11 @@
 from scrapy.crawler import CrawlerProcess
+from ecommerce_spider.download_profiles import apply_download_profile
 from ecommerce_spider.spiders.woo_crawl import WooCrawlSpider
 
 
-def run(domain: str, category: str = "未知分类", config_file: str = None):
-    if not domain or not domain.startswith("http"):
-        print("请传入正确的域名，例如：https://bazaarica.com/sitemaps/en-us/sitemap.xml")
-        return
-
-    # 动态生成文件名
-    site_name = domain.split("//")[-1].replace(".", "_")
-    export_file = f"{site_name}.xlsx"
-
-    process = CrawlerProcess(settings={
+def build_settings(export_file: str, profile: str = None) -> dict:
+    """Woo 爬虫的公共配置，单进程 run() 和分布式 distributed.py 共用"""
+    settings = {
         "PANDAS_EXPORT_FILE": export_file,
         "PANDAS_FIELDS": [
             "SKU", "Name", "Categories", "Regular price", "cf_opingts",
@@ -39,13 +33,47 @@ def run(domain: str, category: str = "未知分类", config_file: str = None):
         "LOG_LEVEL": "INFO",  # 减少日志输出
         "HTTPCACHE_ENABLED": True,  # 启用缓存，重复跑时超快（开发测试用）
 
+        # ==== selectors 自动收窄（学习结果存到 configs/selectors_learned/）====
+        "SELECTOR_LEARNING_ENABLED": True,
+        "SELECTOR_LEARNING_WARMUP": 200,  # 预热页数，之后只跑命中的分支
+
+        # ==== 详情页截断下载（可选）：读到标记或 256KB 就停，缺字段再完整下载 ====
+        "WOO_TRUNCATE_ENABLED": False,
+        "WOO_TRUNCATE_MAX_BYTES": 256 * 1024,
+        "WOO_TRUNCATE_MARKER": "",  # 例如 "woocommerce-tabs"，也可在 selectors 配置里写 truncate_marker
+        "WOO_TRUNCATE_REQUIRED": ["title", "price"],
+
+        # ==== 实时指标：http://127.0.0.1:9410/metrics（Prometheus 文本格式）====
+        "EXTENSIONS": {"ecommerce_spider.extensions.MetricsExtension": 500},
+        "METRICS_ENABLED": True,
+        "METRICS_PORT": 9410,
+        "METRICS_TEXTFILE": None,  # 也可写 textfile，例如 "/var/lib/node_exporter/crawler.prom"
+        "METRICS_INTERVAL": 5,
+
+        # ==== 解析结果缓存：页面内容和 selectors 都没变就跳过提取 ====
+        "PARSE_CACHE_ENABLED": True,
+        "PARSE_CACHE_DIR": ".scrapy/parse_cache",  # 实际文件在 <目录>/<主机名>/ 下；须为本地磁盘，不能放 NFS
+
         # ==== 其他原有设置保持不变 ====
         "ITEM_PIPELINES": {'ecommerce_spider.pipelines.PandasExporter': 300},
         "DOWNLOADER_MIDDLEWARES": {
             'scrapy.downloadermiddlewares.useragent.UserAgentMiddleware': None,
             'ecommerce_spider.middlewares.CustomUserAgentMiddleware': 400,
         },
-    })
+    }
+    return apply_download_profile(settings, profile)
+
+
+def run(domain: str, category: str = "未知分类", config_file: str = None, profile: str = None):
+    if not domain or not domain.startswith("http"):
+        print("请传入正确的域名，例如：https://bazaarica.com/sitemaps/en-us/sitemap.xml")
+        return
+
+    # 动态生成文件名
+    site_name = domain.split("//")[-1].replace(".", "_")
+    export_file = f"{site_name}.xlsx"
+
+    process = CrawlerProcess(settings=build_settings(export_file, profile))
     process.crawl(WooCrawlSpider, domain=domain, category=category, config_file=config_file)
     process.start()          # 阻塞直到爬完
     print(f"\n完成！文件已保存：{export_file}\n")
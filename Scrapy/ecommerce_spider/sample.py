@@ -0,0 +1,41 @@
+# sample.py
+# 新站点 selectors 配置的快速验证：抽样几十个商品页跑提取，打印各字段命中率、价格解析失败和耗时，
+# 不导出 Excel，几十秒内结束。
+#
+# 例：python sample.py https://koreanskincare.nl/sitemap.xml configs/selectors/test.json --size 30
+import argparse
+
+from scrapy.crawler import CrawlerProcess
+
+from ecommerce_spider.spiders.woo_crawl import WooCrawlSpider
+from run import build_settings
+
+
+def sample(domain: str, config_file: str = None, size: int = 30, category: str = "未知分类"):
+    settings = build_settings("sample.xlsx")
+    settings.update({
+        "ITEM_PIPELINES": {},               # 只看统计，不导出
+        "SELECTOR_LEARNING_ENABLED": False,  # 抽样结果不写学习文件
+        "LOG_LEVEL": "WARNING",
+        "CLOSESPIDER_TIMEOUT": 300,          # 兜底，防止卡住
+    })
+    process = CrawlerProcess(settings=settings)
+    process.crawl(
+        WooCrawlSpider,
+        domain=domain,
+        category=category,
+        config_file=config_file,
+        mode="sample",
+        sample_size=size,
+    )
+    process.start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="抽样验证 selectors 配置")
+    parser.add_argument("domain", help="站点地图地址")
+    parser.add_argument("config", nargs="?", default=None, help="selectors 配置文件")
+    parser.add_argument("--size", type=int, default=30, help="抽样商品页数量")
+    args = parser.parse_args()
+
+    sample(args.domain, args.config, args.size)
@@ -0,0 +1,134 @@
+# test_download_profiles.py
+# h2 下载配置档：本地起两个 TLS 服务（支持 h2 / 只支持 HTTP/1.1）验证协商与回退
+import datetime
+
+import pytest
+import pytest_twisted
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from OpenSSL import crypto
+from scrapy import Request, Spider
+from scrapy.utils.test import get_crawler
+from twisted.internet import reactor, ssl
+from twisted.python.failure import Failure
+from twisted.web import http, resource, server
+from twisted.web.client import ResponseFailed
+
+from ecommerce_spider.download_profiles import (
+    DOWNLOAD_PROFILES,
+    H2FallbackDownloadHandler,
+    InvalidNegotiatedProtocol,
+    _not_h2,
+)
+
+pytestmark = pytest.mark.skipif(InvalidNegotiatedProtocol is None, reason="需要 Twisted[http2]")
+
+
+class Echo(resource.Resource):
+    isLeaf = True
+
+    def render_GET(self, request):
+        return b"ok"
+
+
+def make_cert():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    return (
+        crypto.PKey.from_cryptography_key(key),
+        crypto.X509.from_cryptography(cert),
+    )
+
+
+def listen(protocols):
+    key, cert = make_cert()
+    options = ssl.CertificateOptions(privateKey=key, certificate=cert, acceptableProtocols=protocols)
+    site = server.Site(Echo())
+    if b"h2" not in protocols:
+        # 真正只会说 HTTP/1.1：默认的 channel 会识别 h2 前导帧自动切到 HTTP/2
+        site.protocol = http.HTTPChannel
+    return reactor.listenSSL(0, site, options, interface="127.0.0.1")
+
+
+@pytest.fixture
+def h2_server():
+    port = listen([b"h2", b"http/1.1"])
+    yield f"https://127.0.0.1:{port.getHost().port}/"
+    port.stopListening()
+
+
+@pytest.fixture
+def h11_server():
+    port = listen([b"http/1.1"])
+    yield f"https://127.0.0.1:{port.getHost().port}/"
+    port.stopListening()
+
+
+@pytest.fixture
+def handler():
+    settings = {"TWISTED_REACTOR": None}
+    settings.update(DOWNLOAD_PROFILES["h2"])
+    crawler = get_crawler(Spider, settings)
+    crawler.stats.open_spider(None)
+    h = H2FallbackDownloadHandler.from_crawler(crawler)
+    yield h
+    pytest_twisted.blockon(h.close())
+
+
+def test_not_h2_matches_wrapped_reasons():
+    negotiated = InvalidNegotiatedProtocol(b"http/1.1")
+    assert _not_h2(Failure(negotiated))
+    assert _not_h2(Failure(ResponseFailed([negotiated])))
+    assert _not_h2(Failure(ResponseFailed([Failure(negotiated)])))
+    assert not _not_h2(Failure(ResponseFailed([ValueError("x")])))
+
+
+def test_pool_limit_applied_to_frozen_settings(handler):
+    assert handler._h11._pool.maxPersistentPerHost == DOWNLOAD_PROFILES["h2"]["DOWNLOAD_POOL_MAX_PER_HOST"]
+
+
+@pytest_twisted.inlineCallbacks
+def test_h2_server_uses_http2(handler, h2_server):
+    spider = Spider("t")
+    response = yield handler.download_request(Request(h2_server), spider)
+    assert response.body == b"ok"
+    assert response.protocol == "h2"
+    assert not handler._h1_hosts
+
+
+@pytest_twisted.inlineCallbacks
+def test_http11_only_server_falls_back(handler, h11_server):
+    spider = Spider("t")
+    response = yield handler.download_request(Request(h11_server), spider)
+    assert response.body == b"ok"
+    assert response.protocol == "HTTP/1.1"
+    assert len(handler._h1_hosts) == 1
+    assert handler.stats.get_value("connection/h2_fallback_hosts") == 1
+
+    # 记住了这个 host，后续请求直接走 HTTP/1.1
+    response = yield handler.download_request(Request(h11_server), spider)
+    assert response.protocol == "HTTP/1.1"
+    assert handler.stats.get_value("connection/h2_fallback_hosts") == 1
+
+
+@pytest_twisted.inlineCallbacks
+def test_truncated_download_uses_http11(handler, h2_server):
+    # 截断下载依赖 bytes_received 信号，HTTP/2 不发，必须走 HTTP/1.1
+    spider = Spider("t")
+    request = Request(h2_server, meta={"truncate_download": True})
+    response = yield handler.download_request(request, spider)
+    assert response.protocol == "HTTP/1.1"
+    assert not handler._h1_hosts  # 不影响这个 host 其他请求走 h2
@@ -0,0 +1,54 @@
+# test_extensions.py
+from scrapy import Spider
+from scrapy.utils.test import get_crawler
+
+from ecommerce_spider import extensions
+from ecommerce_spider.extensions import MetricsExtension, render_all
+
+
+def make_ext(domain, items, textfile=None):
+    crawler = get_crawler(Spider, {"METRICS_ENABLED": True})
+    spider = Spider("shop")
+    spider.domain = domain
+    crawler.stats.open_spider(spider)
+    crawler.stats.set_value("item_scraped_count", items)
+    ext = MetricsExtension(crawler, port=0, textfile=textfile, interval=5)
+    ext.spider = spider
+    ext._last_time = 0
+    return ext
+
+
+def test_samples_grouped_by_metric(monkeypatch):
+    monkeypatch.setattr(extensions, "_registry", [make_ext("https://a", 1), make_ext("https://b", 2)])
+    lines = render_all().splitlines()
+
+    assert lines[0] == "# TYPE crawler_items_total counter"
+    assert lines[1].startswith('crawler_items_total{spider="shop",site="https://a"} 1')
+    assert lines[2].startswith('crawler_items_total{spider="shop",site="https://b"} 2')
+
+    # 每个指标名的样本连续，且只有一个 TYPE 行
+    names = [line.split("{")[0] for line in lines if not line.startswith("#")]
+    seen = []
+    for name in names:
+        if not seen or seen[-1] != name:
+            assert name not in seen
+            seen.append(name)
+    assert sum(line.startswith("# TYPE") for line in lines) == len(seen)
+
+
+def test_textfile_keeps_final_state_after_close(monkeypatch, tmp_path):
+    textfile = tmp_path / "crawler.prom"
+    ext = make_ext("https://a", 7, textfile=str(textfile))
+    monkeypatch.setattr(extensions, "_registry", [ext])
+
+    ext.spider_closed(ext.spider)
+    assert extensions._registry == []
+    assert 'crawler_items_total{spider="shop",site="https://a"} 7' in textfile.read_text()
+
+
+def test_tick_survives_textfile_errors(monkeypatch, tmp_path):
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("")
+    ext = make_ext("https://a", 1, textfile=str(blocker / "crawler.prom"))
+    monkeypatch.setattr(extensions, "_registry", [ext])
+    ext.tick()  # 不抛异常，LoopingCall 不会停
@@ -0,0 +1,33 @@
+# test_fast_json.py
+import json
+
+import pytest
+
+from ecommerce_spider import fast_json
+
+PAGE = json.dumps({"products": [{"id": 1, "price": "9.5"}, {"id": 2, "body_html": "x" * 100}]}).encode()
+
+
+def test_loads_bytes():
+    assert fast_json.loads(b'{"currency": "EUR"}') == {"currency": "EUR"}
+
+
+def test_loads_falls_back_when_orjson_rejects():
+    body = b'{"body_html": "a\\ud83d b"}'  # 孤立代理项：orjson 拒绝，标准库接受
+    assert fast_json.loads(body) == {"body_html": "a\ud83d b"}
+
+
+def test_iter_items_full_parse():
+    items = list(fast_json.iter_items(PAGE, "products", stream_threshold=0))
+    assert [p["id"] for p in items] == [1, 2]
+
+
+@pytest.mark.skipif(fast_json.ijson is None, reason="需要 ijson")
+def test_iter_items_streaming():
+    items = list(fast_json.iter_items(PAGE, "products", stream_threshold=10))
+    assert [p["id"] for p in items] == [1, 2]
+    assert isinstance(items[0]["id"], int)
+
+
+def test_iter_items_missing_key():
+    assert list(fast_json.iter_items(b"{}", "products", stream_threshold=0)) == []
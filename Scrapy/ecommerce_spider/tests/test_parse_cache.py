@@ -0,0 +1,50 @@
+# test_parse_cache.py
+import sqlite3
+
+from ecommerce_spider.parse_cache import ParseCache
+
+
+def test_hit_miss_and_config_invalidation(tmp_path):
+    path = str(tmp_path / "site.db")
+    cache = ParseCache(path, "cfg1")
+    cache.put("https://a/p1", "h1", {"SKU": "A"})
+    assert cache.get("https://a/p1", "h1") == {"SKU": "A"}
+    assert cache.get("https://a/p1", "h2") is None
+    cache.close()
+
+    cache = ParseCache(path, "cfg2")
+    assert cache.purged == 1
+    assert cache.get("https://a/p1", "h1") is None
+    cache.close()
+
+
+def test_shared_file_between_workers(tmp_path):
+    path = str(tmp_path / "site.db")
+    workers = [ParseCache(path, "cfg") for _ in range(4)]
+    for i in range(60):
+        workers[i % 4].put(f"https://a/p{i}", "h", {"SKU": str(i)})
+    # 每次写入都已提交，其他 worker 立即可见
+    assert workers[0].get("https://a/p59", "h") == {"SKU": "59"}
+    assert sum(w.errors for w in workers) == 0
+    for w in workers:
+        w.close()
+
+
+def test_lock_timeout_skips_write_not_parse(tmp_path):
+    path = str(tmp_path / "site.db")
+    cache = ParseCache(path, "cfg", timeout=0.1)
+    cache.put("https://a/p1", "h", {"SKU": "A"})
+
+    # 另一个进程独占锁
+    blocker = sqlite3.connect(path, isolation_level=None)
+    blocker.execute("BEGIN EXCLUSIVE")
+    try:
+        cache.put("https://a/p2", "h", {"SKU": "B"})  # 不抛异常，只记一次失败
+        assert cache.errors == 1
+        # WAL 下写锁不挡读
+        assert cache.get("https://a/p1", "h") == {"SKU": "A"}
+    finally:
+        blocker.execute("ROLLBACK")
+        blocker.close()
+    assert cache.get("https://a/p2", "h") is None
+    cache.close()
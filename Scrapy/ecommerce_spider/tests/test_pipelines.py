@@ -0,0 +1,64 @@
+# test_pipelines.py
+import pandas as pd
+import pytest_twisted
+from scrapy import Spider
+from scrapy.utils.test import get_crawler
+
+from ecommerce_spider.pipelines import PandasExporter, export_deferred, export_started, write_excel_in_process
+
+FIELDS = ["SKU", "Name", "Description"]
+
+
+def test_write_excel_in_process(tmp_path):
+    desc = "x" * 1000
+    rows = [("A", "n1", desc), ("B", "n2", desc), ("A", "dup", desc)]
+    out = str(tmp_path / "out" / "site.xlsx")
+
+    assert write_excel_in_process(rows, FIELDS, out) == 2
+    assert rows == []  # 父进程里的缓存已释放
+    assert list(tmp_path.joinpath("out").iterdir()) == [tmp_path / "out" / "site.xlsx"]  # 临时文件已删
+
+    df = pd.read_excel(out)
+    assert list(df["SKU"]) == ["A", "B"]
+    assert list(df["Name"]) == ["n1", "n2"]
+
+
+@pytest_twisted.inlineCallbacks
+def test_export_deferred_process_frees_thread(tmp_path):
+    desc = "x" * 1000
+    rows = [("A", "n1", desc), ("B", "n2", desc)]
+    out = str(tmp_path / "site.xlsx")
+
+    count = yield export_deferred(rows, FIELDS, out, executor="process")
+    assert count == 2
+    assert rows == []
+    assert list(tmp_path.iterdir()) == [tmp_path / "site.xlsx"]  # 临时文件已删
+
+
+@pytest_twisted.inlineCallbacks
+def test_exporter_close_spider(tmp_path):
+    out = str(tmp_path / "site.xlsx")
+    exporter = PandasExporter(out, FIELDS, executor="thread")
+    spider = Spider("shop")
+    spider.export_file = out
+    exporter.open_spider(spider)
+    exporter.process_item({"SKU": "A", "Name": "n1"}, spider)
+
+    yield exporter.close_spider(spider)
+    assert list(pd.read_excel(out)["SKU"]) == ["A"]
+
+
+@pytest_twisted.inlineCallbacks
+def test_export_started_sent_before_export_finishes(tmp_path):
+    crawler = get_crawler(Spider, {"PANDAS_EXPORT_FILE": str(tmp_path / "site.xlsx"), "PANDAS_FIELDS": FIELDS})
+    exporter = PandasExporter.from_crawler(crawler)
+    spider = Spider("shop")
+    spider.export_file = str(tmp_path / "site.xlsx")
+    exporter.open_spider(spider)
+    exporter.process_item({"SKU": "A"}, spider)
+
+    started = []
+    crawler.signals.connect(lambda spider: started.append(spider), signal=export_started, weak=False)
+    d = exporter.close_spider(spider)
+    assert started == [spider] and not d.called  # 导出还在跑，下一个站已经可以启动
+    yield d
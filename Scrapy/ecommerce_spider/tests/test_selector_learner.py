@@ -0,0 +1,34 @@
+# test_selector_learner.py
+import json
+
+from ecommerce_spider.selector_learner import SelectorLearner, split_union
+
+
+def test_split_union_top_level():
+    assert split_union("//h1/text() | //h2/text()|//h3") == ["//h1/text()", "//h2/text()", "//h3"]
+    assert split_union("//h1/text()") == ["//h1/text()"]
+
+
+def test_split_union_ignores_pipe_in_predicate():
+    expr = "//div[@id='a' or (self::p | self::span)]/text() | //h1"
+    assert split_union(expr) == ["//div[@id='a' or (self::p | self::span)]/text()", "//h1"]
+
+
+def test_split_union_ignores_pipe_in_quotes():
+    expr = "//meta[@content=\"a | b\"]/@content | //span[contains(text(), '|')]"
+    assert split_union(expr) == ["//meta[@content=\"a | b\"]/@content", "//span[contains(text(), '|')]"]
+
+
+def test_split_union_nested_brackets():
+    expr = "(//ul[li[a[contains(@href, '|')] | b]])[1] | //ol[(x|y)][1]"
+    assert split_union(expr) == ["(//ul[li[a[contains(@href, '|')] | b]])[1]", "//ol[(x|y)][1]"]
+
+
+def test_save_is_atomic(tmp_path):
+    learned_file = tmp_path / "learned" / "site.json"
+    learner = SelectorLearner({"title": "//h1 | //h2"}, ["title"], str(learned_file))
+    learner.narrowed["title"] = "//h1"
+    learner.save()
+
+    assert json.loads(learned_file.read_text(encoding="utf-8"))["title"]["narrowed"] == "//h1"
+    assert [p.name for p in learned_file.parent.iterdir()] == ["site.json"]  # 没有残留临时文件
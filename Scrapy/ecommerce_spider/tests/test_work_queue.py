@@ -0,0 +1,84 @@
+# test_work_queue.py
+import json
+
+from scrapy.http import HtmlResponse
+
+from ecommerce_spider.spiders.woo_crawl import WooCrawlSpider
+from ecommerce_spider.work_queue import WorkQueue
+
+
+def test_claim_done_and_unfinished(tmp_path):
+    queue = WorkQueue(str(tmp_path / "q.db"))
+    assert queue.add_urls(["a", "b", "c"]) == 3
+    assert queue.add_urls(["a"]) == 0
+
+    assert sorted(queue.claim("w1", 10)) == ["a", "b", "c"]
+    queue.mark_done(["a"])
+    queue.mark_failed("b")
+    assert queue.fail_unfinished("w1") == 1  # c 没有结果
+    assert queue.counts() == {"done": 1, "pending": 2}  # 还有重试次数，放回队列
+
+
+def test_failed_urls_retry_until_max_attempts(tmp_path):
+    queue = WorkQueue(str(tmp_path / "q.db"), max_attempts=2)
+    queue.add_urls(["a"])
+    queue.claim("w1", 10)
+    queue.mark_failed("a")
+    assert queue.counts() == {"pending": 1}
+
+    queue.claim("w2", 10)
+    queue.mark_failed("a")
+    assert queue.counts() == {"failed": 1}
+
+    # 手动放回队列，重试次数清零
+    assert queue.requeue_failed() == 1
+    assert queue.claim("w1", 10) == ["a"]
+
+
+def test_claim_caps_at_fair_share(tmp_path):
+    queue = WorkQueue(str(tmp_path / "q.db"))
+    queue.add_urls([f"u{i}" for i in range(10)])
+    assert len(queue.claim("w1", 100)) == 10  # 只有一个 worker，可以全领
+
+    queue.add_urls([f"v{i}" for i in range(10)])
+    assert len(queue.claim("w2", 100)) == 5   # w1 还在忙：只领一半
+    assert len(queue.claim("w3", 100)) == 2   # 剩 5 个，三个活跃 worker 平分
+
+
+def test_requeue_stale_fails_after_max_attempts(tmp_path):
+    queue = WorkQueue(str(tmp_path / "q.db"))
+    queue.add_urls(["a"])
+    for _ in range(2):
+        queue.claim("crashed", 10)
+        assert queue.requeue_stale(max_age=-1, max_attempts=3) == 1
+
+    # 第三次还崩溃：不再放回队列，置为 failed，队列能清空
+    queue.claim("crashed", 10)
+    assert queue.requeue_stale(max_age=-1, max_attempts=3) == 0
+    assert queue.counts() == {"failed": 1}
+
+
+def test_worker_marks_done_only_after_part_written(tmp_path):
+    queue_file = str(tmp_path / "q.db")
+    queue = WorkQueue(queue_file)
+    queue.add_urls(["https://shop.test/p1", "https://shop.test/p2", "https://shop.test/p3"])
+
+    spider = WooCrawlSpider(
+        domain="https://shop.test", mode="worker", queue_file=queue_file, worker_id="w1",
+    )
+    spider.truncate_enabled = False
+    spider.work_queue.claim("w1", 10)
+
+    def response(url):
+        return HtmlResponse(url, body=b"<html></html>", request=spider.detail_request(url))
+
+    spider.record_result(response("https://shop.test/p1"), {"SKU": "A"})
+    spider.record_result(response("https://shop.test/p2"))  # 解析失败
+    # p3 没有任何结果
+
+    assert queue.counts() == {"claimed": 3}
+    spider.flush_batch()
+
+    with open(spider.part_file, encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == [{"SKU": "A"}]
+    assert queue.counts() == {"done": 1, "pending": 2}  # p2、p3 放回队列重试